@@ -0,0 +1,85 @@
+import hashlib
+from typing import Any, List, Optional
+
+import numpy as np
+from diskcache import Cache
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.embeddings.ollama import OllamaEmbedding
+from ollama import AsyncClient
+
+
+class CachedOllamaEmbedding(OllamaEmbedding):
+    """Ollama embeddings backed by a persistent on-disk cache keyed by content hash.
+
+    Unchanged chunks hit the cache on re-index, so only new text is sent to Ollama.
+    """
+
+    _cache: Any = PrivateAttr()
+
+    def __init__(self, cache_path: str, async_client: Optional[AsyncClient] = None, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        if async_client is not None:
+            self._async_client = async_client
+        self._cache = Cache(cache_path, eviction_policy="least-recently-used")
+
+    def _cache_key(self, kind: str, text: str) -> str:
+        """Key vectors by model as well, different models produce incompatible vectors."""
+        return f"{self.model_name}:{kind}:{hashlib.blake2b(text.encode(), digest_size=20).hexdigest()}"
+
+    def _get_cached(self, key: str):
+        raw = self._cache.get(key)
+        if raw is None:
+            return None
+        return np.frombuffer(raw, dtype=np.float32).tolist()
+
+    def _set_cached(self, key: str, embedding: List[float]) -> None:
+        self._cache.set(key, np.asarray(embedding, dtype=np.float32).tobytes())
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        key = self._cache_key("query", query)
+        embedding = self._get_cached(key)
+        if embedding is None:
+            embedding = super()._get_query_embedding(query)
+            self._set_cached(key, embedding)
+        return embedding
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        key = self._cache_key("query", query)
+        embedding = self._get_cached(key)
+        if embedding is None:
+            embedding = await super()._aget_query_embedding(query)
+            self._set_cached(key, embedding)
+        return embedding
+
+    def _split_cached(self, texts: List[str]):
+        """Look up cached text vectors, returning the keys, hits and indices of misses."""
+        keys = [self._cache_key("text", text) for text in texts]
+        embeddings = [self._get_cached(key) for key in keys]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        return keys, embeddings, missing
+
+    def _fill_missing(self, keys, embeddings, missing, computed) -> List[List[float]]:
+        for i, embedding in zip(missing, computed):
+            self._set_cached(keys[i], embedding)
+            embeddings[i] = embedding
+        return embeddings
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        keys, embeddings, missing = self._split_cached(texts)
+        if not missing:
+            return embeddings
+        computed = super()._get_text_embeddings([texts[i] for i in missing])
+        return self._fill_missing(keys, embeddings, missing, computed)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        keys, embeddings, missing = self._split_cached(texts)
+        if not missing:
+            return embeddings
+        computed = await super()._aget_text_embeddings([texts[i] for i in missing])
+        return self._fill_missing(keys, embeddings, missing, computed)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embeddings([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return (await self._aget_text_embeddings([text]))[0]
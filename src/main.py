@@ -1,11 +1,18 @@
 import streamlit as st
-from query import ask
 import time
 import os
 
 model_name = os.getenv("MODEL_NAME", "codellama:7b")
 index_model_name = os.getenv("INDEX_MODEL_NAME", "all-minilm:l6-v2")
 
+
+@st.cache_resource
+def get_query_scheduler():
+    """Share one index manager, query scheduler and Ollama connection pool across reruns and sessions."""
+    from query import get_query_scheduler
+    return get_query_scheduler()
+
+
 st.set_page_config(page_title="AI Code Assistant", layout="wide")
 st.title("🤖 Local AI code assistant")
 
@@ -19,10 +26,9 @@ if st.button("🔍 Ask") and query.strip():
 
         start_time = time.time();
 
-        result = ask(query)
+        st.markdown("### ✅ Answer:")
+        st.write_stream(get_query_scheduler().submit(query))
 
         duration = time.time() - start_time;
 
-        st.markdown("### ✅ Answer:")
-        st.write(result)
         st.markdown(f"⏱️  **Time taken:** `{duration:.2f}` seconds")
@@ -1,11 +1,32 @@
 import os
 import time
-from llama_index.core import Settings, StorageContext, load_index_from_storage
+import queue
+import asyncio
+import hashlib
+import itertools
+import threading
+import contextlib
+from functools import partial
+from collections import OrderedDict
+import httpx
+import numpy as np
+from ollama import AsyncClient
+from watchdog.observers import Observer
+from watchdog.events import FileSystemEventHandler
+from llama_index.core import QueryBundle, Settings, StorageContext, get_response_synthesizer, load_index_from_storage
+from llama_index.core.postprocessor import LongContextReorder, SimilarityPostprocessor
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
 from llama_index.core.prompts import PromptTemplate
+from llama_index.core.query_engine import RetrieverQueryEngine
+from llama_index.core.schema import MetadataMode
+from llama_index.core.storage.docstore import SimpleDocumentStore
+from llama_index.core.storage.index_store import SimpleIndexStore
 from llama_index.llms.ollama import Ollama
-from llama_index.embeddings.ollama import OllamaEmbedding
 from dotenv import load_dotenv
 
+from embeddings import CachedOllamaEmbedding
+from vector_store import load_vector_store
+
 load_dotenv()
 
 project_path = os.getenv("SOURCE_PATH", "/app/source")
@@ -13,22 +34,17 @@ storage_path = os.getenv("INDEX_STORAGE", "/app/index")
 model_name = os.getenv("MODEL_NAME", "codellama:7b")
 index_model_name = os.getenv("INDEX_MODEL_NAME", "all-minilm:l6-v2")
 ollama_base_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+embed_batch_size = int(os.getenv("EMBED_BATCH_SIZE", "128"))
+embed_cache_path = os.getenv("EMBED_CACHE_PATH", "/app/cache/embeddings")
+query_cache_size = int(os.getenv("QUERY_CACHE_SIZE", "256"))
+semantic_cache_size = int(os.getenv("SEMANTIC_CACHE_SIZE", "256"))
+semantic_cache_threshold = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+context_token_budget = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6144"))
+query_concurrency = int(os.getenv("QUERY_CONCURRENCY", "4"))
+llm_keep_alive = os.getenv("LLM_KEEP_ALIVE", "30m")
 
-# Custom prompt to force model to work only with our source
+# Only the per-query parts live in the QA template, the static rules are in SYSTEM_PROMPT
 STRICT_CONTEXT_PROMPT = PromptTemplate(
-    "You are a code analysis assistant. Your ONLY job is to answer questions using EXCLUSIVELY "
-    "the context information provided below. You MUST NOT use any external knowledge, pre-training, "
-    "or information about other projects.\n\n"
-
-    "CRITICAL RULES:\n"
-    "1. ONLY use information explicitly stated in the Context section below\n"
-    "2. If the Context does not contain the answer, you MUST respond: "
-    "'I couldn't find relevant information in the provided sources.'\n"
-    "3. DO NOT use your general knowledge about programming, frameworks, or other projects\n"
-    "4. DO NOT make assumptions or inferences beyond what is explicitly stated\n"
-    "5. When referencing code, quote the actual file paths from the context\n"
-    "6. If you're unsure, say so rather than guessing\n\n"
-
     "Context from the project source code:\n"
     "--------------------\n"
     "{context_str}\n"
@@ -39,26 +55,52 @@ STRICT_CONTEXT_PROMPT = PromptTemplate(
     "Answer based ONLY on the context above:"
 )
 
+# Pooled HTTP client shared by the LLM and the embedding model, so requests reuse keep-alive connections.
+# All queries run through the query scheduler, so it is only ever used from the scheduler's event loop.
+ollama_async_client = AsyncClient(
+    host=ollama_base_url,
+    timeout=300.0,
+    limits=httpx.Limits(max_keepalive_connections=32),
+)
+
 # Configure with longer timeouts and stricter behavior
-embed_model = OllamaEmbedding(
+embed_model = CachedOllamaEmbedding(
+    cache_path=embed_cache_path,
+    async_client=ollama_async_client,
     model_name=index_model_name,
     base_url=ollama_base_url,
+    embed_batch_size=embed_batch_size,
     request_timeout=300.0,
 )
 
-# System prompt to constrain the LLM
+# Answer given when no context is relevant to the question
+NOT_FOUND_MESSAGE = "I couldn't find relevant information in the provided sources."
+
+# System prompt to constrain the LLM. It is identical for every query, so Ollama can reuse
+# its KV cache for this prefix while the model stays loaded.
 SYSTEM_PROMPT = (
-    "You are a code assistant that ONLY answers based on provided context. "
-    "Never use external knowledge. If the context doesn't contain the answer, say so."
+    "You are a code analysis assistant. Your ONLY job is to answer questions using EXCLUSIVELY "
+    "the context information provided with each question. You MUST NOT use any external knowledge, "
+    "pre-training, or information about other projects.\n\n"
+
+    "CRITICAL RULES:\n"
+    "1. ONLY use information explicitly stated in the provided Context section\n"
+    f"2. If the Context does not contain the answer, you MUST respond: '{NOT_FOUND_MESSAGE}'\n"
+    "3. DO NOT use your general knowledge about programming, frameworks, or other projects\n"
+    "4. DO NOT make assumptions or inferences beyond what is explicitly stated\n"
+    "5. When referencing code, quote the actual file paths from the context\n"
+    "6. If you're unsure, say so rather than guessing"
 )
 
 llm = Ollama(
     model=model_name,
     base_url=ollama_base_url,
     request_timeout=300.0,
+    async_client=ollama_async_client,
     system_prompt=SYSTEM_PROMPT,
+    keep_alive=llm_keep_alive,  # Keep the model and its prompt cache resident between queries
     temperature=0.1,
-    context_window=4096,
+    context_window=16384,  # What Ollama supports for codellama, avoids forced truncation
 )
 
 # Set global settings to use Ollama models
@@ -67,6 +109,131 @@ Settings.embed_model = embed_model
 Settings.chunk_size = 512  # Smaller chunks for better precision
 Settings.chunk_overlap = 50  # Some overlap to maintain context
 
+# Retrieval limits: fewer, more relevant chunks mean less prompt to prefill
+SIMILARITY_TOP_K = 5
+SIMILARITY_CUTOFF = 0.5
+
+
+class TokenBudgetPostprocessor(BaseNodePostprocessor):
+    """Drops the lowest ranked nodes once the retrieved context exceeds a token budget."""
+
+    max_tokens: int = 2500
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "TokenBudgetPostprocessor"
+
+    def _postprocess_nodes(self, nodes, query_bundle=None):
+        tokenizer = Settings.tokenizer
+        kept_nodes = []
+        used_tokens = 0
+        for node in nodes:
+            node_tokens = len(tokenizer(node.node.get_content(metadata_mode=MetadataMode.LLM)))
+            # Always keep the best match, even when it alone exceeds the budget
+            if kept_nodes and used_tokens + node_tokens > self.max_tokens:
+                break
+            kept_nodes.append(node)
+            used_tokens += node_tokens
+        return kept_nodes
+
+
+# Persisted index files and the loaders used to parse them
+INDEX_STORES = {
+    "docstore": ("docstore.json", SimpleDocumentStore.from_persist_dir),
+    "index_store": ("index_store.json", SimpleIndexStore.from_persist_dir),
+    "vector_store": ("default__vector_store.json", partial(load_vector_store, read_only=True)),
+}
+
+
+class SemanticCache:
+    """Fixed-size cache that matches paraphrased queries by embedding similarity.
+
+    The capacity is small, so a lookup scores every cached query vector with a
+    single matrix-vector product instead of relying on approximate bucketing.
+    """
+
+    def __init__(self, capacity, threshold=0.95):
+        self.capacity = capacity
+        self.threshold = threshold
+        self._keys = None
+        self._answers = [None] * capacity
+        self._versions = np.zeros(capacity, dtype=np.int64)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, embedding, version):
+        """Return the answer of the most similar query cached for this index version above the threshold."""
+        if self.capacity <= 0:
+            return None
+
+        vector = self._normalize(embedding)
+        with self._lock:
+            if self._keys is None or self._keys.shape[1] != vector.shape[0] or not self._count:
+                return None
+
+            filled = min(self._count, self.capacity)
+            scores = np.where(self._versions[:filled] == version, self._keys[:filled] @ vector, -np.inf)
+            best = int(np.argmax(scores))
+            if scores[best] >= self.threshold:
+                return self._answers[best]
+        return None
+
+    def put(self, embedding, answer: str, version):
+        """Remember an answer for an index version, overwriting the oldest entry when full."""
+        if self.capacity <= 0:
+            return
+
+        vector = self._normalize(embedding)
+        with self._lock:
+            if self._keys is None or self._keys.shape[1] != vector.shape[0]:
+                self._reset(vector.shape[0])
+
+            slot = self._count % self.capacity
+            self._keys[slot] = vector
+            self._answers[slot] = answer
+            self._versions[slot] = version
+            self._count += 1
+
+    def _reset(self, dimension=None):
+        self._keys = None if dimension is None else np.zeros((self.capacity, dimension), dtype=np.float32)
+        self._answers = [None] * self.capacity
+        self._versions = np.zeros(self.capacity, dtype=np.int64)
+        self._count = 0
+
+    def clear(self):
+        """Forget all cached queries."""
+        with self._lock:
+            self._reset()
+
+
+class IndexChangeHandler(FileSystemEventHandler):
+    """Handler for file system events in the index storage directory."""
+
+    def __init__(self, on_change):
+        self.on_change = on_change
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.on_change()
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.on_change()
+
+    def on_deleted(self, event):
+        if not event.is_directory:
+            self.on_change()
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.on_change()
+
 
 class DynamicIndexManager:
     """Manages the vector index and automatically reloads when changes are detected."""
@@ -76,38 +243,134 @@ class DynamicIndexManager:
         self.index = None
         self.query_engine = None
         self.last_modified = 0
+        # Parsed stores are reused across reloads until their file changes
+        self._stores = {}
+        self._store_mtimes = {}
+        self._response_synthesizer = get_response_synthesizer(
+            llm=llm,
+            response_mode="compact",
+            text_qa_template=STRICT_CONTEXT_PROMPT,
+            streaming=True,
+        )
+        self._sentinel = self._find_sentinel()
+        # Exact-match answer cache, keyed by query hash + index mtime + model
+        self._answer_cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        # Semantic answer cache for paraphrased queries
+        self._semantic_cache = SemanticCache(semantic_cache_size, threshold=semantic_cache_threshold)
+        # Set from the watcher thread, so the query path never touches the filesystem
+        self._dirty = False
+        # Concurrent queries may all see the dirty flag, only one of them reloads
+        self._reload_lock = threading.Lock()
+        self._observer = self._start_watcher()
         self._load_index()
 
+    def _start_watcher(self):
+        """Watch the storage directory and flag the index as dirty on changes."""
+        os.makedirs(self.storage_path, exist_ok=True)
+        observer = Observer()
+        observer.schedule(IndexChangeHandler(self._mark_dirty), self.storage_path, recursive=True)
+        observer.daemon = True
+        observer.start()
+        return observer
+
+    def _mark_dirty(self):
+        self._dirty = True
+
+    def _find_sentinel(self):
+        """Pick the index file whose mtime signals that the index was persisted."""
+        sentinel = os.path.join(self.storage_path, "docstore.json")
+        if os.path.exists(sentinel) or not os.path.exists(self.storage_path):
+            return sentinel
+
+        # One-shot fallback for layouts without a docstore: track the newest file
+        latest = max(self._walk_mtimes(self.storage_path), default=None)
+        return latest[1] if latest else sentinel
+
+    @classmethod
+    def _walk_mtimes(cls, path):
+        """Yield (mtime_ns, path) for every file below path, using cached directory entries."""
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            yield from cls._walk_mtimes(entry.path)
+                        else:
+                            yield entry.stat(follow_symlinks=False).st_mtime_ns, entry.path
+                    except OSError:
+                        continue
+        except OSError:
+            return
+
     def _get_index_modification_time(self):
-        """Get the latest modification time of index files."""
-        if not os.path.exists(self.storage_path):
+        """Get the modification time of the index sentinel file."""
+        try:
+            return os.stat(self._sentinel).st_mtime_ns
+        except FileNotFoundError:
             return 0
 
-        latest_time = 0
-        for root, dirs, files in os.walk(self.storage_path):
-            for file in files:
-                file_path = os.path.join(root, file)
-                try:
-                    mod_time = os.path.getmtime(file_path)
-                    latest_time = max(latest_time, mod_time)
-                except OSError:
-                    continue
-        return latest_time
+    def _cache_key(self, query_text: str, index_version):
+        """Build the answer cache key for a query against an index version."""
+        digest = hashlib.blake2b(query_text.encode(), digest_size=16).digest()
+        return digest, index_version, model_name
+
+    def _get_cached_answer(self, key):
+        """Return a cached answer and mark it as recently used."""
+        with self._cache_lock:
+            answer = self._answer_cache.get(key)
+            if answer is not None:
+                self._answer_cache.move_to_end(key)
+            return answer
+
+    def _cache_answer(self, key, answer: str):
+        """Store an answer, evicting the least recently used entries."""
+        if query_cache_size <= 0:
+            return
+
+        with self._cache_lock:
+            self._answer_cache[key] = answer
+            self._answer_cache.move_to_end(key)
+            while len(self._answer_cache) > query_cache_size:
+                self._answer_cache.popitem(last=False)
+
+    def _clear_cache(self):
+        """Drop cached answers, they are stale once the index changes."""
+        with self._cache_lock:
+            self._answer_cache.clear()
+        self._semantic_cache.clear()
+
+    def _load_storage_context(self):
+        """Build a storage context, parsing only the store files that changed since the last load."""
+        for name, (file_name, loader) in INDEX_STORES.items():
+            try:
+                mod_time = os.stat(os.path.join(self.storage_path, file_name)).st_mtime_ns
+            except FileNotFoundError:
+                mod_time = 0
+
+            if name not in self._stores or self._store_mtimes.get(name) != mod_time:
+                self._stores[name] = loader(self.storage_path)
+                self._store_mtimes[name] = mod_time
+
+        return StorageContext.from_defaults(persist_dir=self.storage_path, **self._stores)
 
     def _load_index(self):
         """Load the index from storage."""
+        self._clear_cache()
         try:
-            if os.path.exists(self.storage_path):
-                storage_context = StorageContext.from_defaults(persist_dir=self.storage_path)
+            if os.path.exists(self._sentinel):
+                storage_context = self._load_storage_context()
                 self.index = load_index_from_storage(storage_context)
-                self.query_engine = self.index.as_query_engine(
-                    llm=llm,
-                    embed_model=embed_model,
-                    similarity_top_k=10,
-                    response_mode="compact",
-                    text_qa_template=STRICT_CONTEXT_PROMPT,
-                    streaming=False,
-                    node_postprocessors=[],
+                # The response synthesizer (LLM + prompt) survives reloads, only the retriever is swapped
+                self.query_engine = RetrieverQueryEngine(
+                    retriever=self.index.as_retriever(embed_model=embed_model, similarity_top_k=SIMILARITY_TOP_K),
+                    response_synthesizer=self._response_synthesizer,
+                    node_postprocessors=[
+                        SimilarityPostprocessor(similarity_cutoff=SIMILARITY_CUTOFF),
+                        TokenBudgetPostprocessor(max_tokens=context_token_budget),
+                        # Reorder last so the budget trims by score, not by position
+                        LongContextReorder(),
+                    ],
                 )
                 self.last_modified = self._get_index_modification_time()
                 print(f"📚 Index loaded from: {self.storage_path}")
@@ -121,44 +384,228 @@ class DynamicIndexManager:
             self.query_engine = None
 
     def _check_and_reload_if_needed(self):
-        """Check if index has been updated and reload if necessary."""
-        current_mod_time = self._get_index_modification_time()
-        if current_mod_time > self.last_modified:
-            print(f"🔄 Index has been updated, reloading...")
-            self._load_index()
+        """Reload the index if the watcher has seen it change."""
+        if self._dirty:
+            with self._reload_lock:
+                if self._dirty:
+                    self._dirty = False
+                    print(f"🔄 Index has been updated, reloading...")
+                    self._load_index()
+
+    @staticmethod
+    def _format_sources(response):
+        """Format the source files of a response for debugging."""
+        if not getattr(response, 'source_nodes', None):
+            return ""
+
+        sources = set()
+        for node in response.source_nodes[:5]:  # Top 5 sources
+            if hasattr(node.node, 'metadata') and 'file_path' in node.node.metadata:
+                sources.add(node.node.metadata['file_path'])
+
+        if not sources:
+            return ""
+        return "\n\n📁 Sources used:\n" + "\n".join(f"- {s}" for s in sources)
+
+    async def aquery(self, query_text: str):
+        """Query the index, reloading if necessary, and stream the answer in text chunks.
+
+        Retrieval and generation are async, so the scheduler's workers can overlap queries.
+        """
+        await asyncio.to_thread(self._check_and_reload_if_needed)
 
-    def query(self, query_text: str):
-        """Query the index, reloading if necessary."""
-        self._check_and_reload_if_needed()
+        # Answers are only cached for the index version they were generated from
+        query_engine = self.query_engine
+        index_version = self.last_modified
+        if not query_engine:
+            yield "❌ Error: Index not available. Please wait for initial indexing to complete."
+            return
 
-        if not self.query_engine:
-            return "❌ Error: Index not available. Please wait for initial indexing to complete."
+        cache_key = self._cache_key(query_text, index_version)
+        cached_answer = self._get_cached_answer(cache_key)
+        if cached_answer is not None:
+            yield cached_answer
+            return
 
         try:
-            response = self.query_engine.query(query_text)
+            # Embed once and reuse the vector for the semantic cache and retrieval
+            query_embedding = await embed_model.aget_query_embedding(query_text)
+            similar_answer = self._semantic_cache.get(query_embedding, index_version)
+            if similar_answer is not None:
+                self._cache_answer(cache_key, similar_answer)
+                yield similar_answer
+                return
 
-            # Add source information for debugging
-            answer = response.response
+            response = await query_engine.aquery(QueryBundle(query_text, embedding=query_embedding))
 
-            # Optional: Add source file references
-            if hasattr(response, 'source_nodes') and response.source_nodes:
-                sources = set()
-                for node in response.source_nodes[:5]:  # Top 5 sources
-                    if hasattr(node.node, 'metadata') and 'file_path' in node.node.metadata:
-                        sources.add(node.node.metadata['file_path'])
+            # Every node fell below the similarity cutoff, so there is nothing to answer from.
+            # Not cached, the answer may change once the index does.
+            if not response.source_nodes:
+                yield NOT_FOUND_MESSAGE
+                return
 
-                if sources:
-                    answer += "\n\n📁 Sources used:\n" + "\n".join(f"- {s}" for s in sources)
+            # Stream tokens as they are generated, keeping them for the caches
+            chunks = []
+            async for token in response.async_response_gen():
+                chunks.append(token)
+                yield token
 
-            return answer
+            # Source file references are added once generation has finished
+            sources = self._format_sources(response)
+            if sources:
+                chunks.append(sources)
+                yield sources
+
+            # Skip caching when the index was reloaded while this answer was generated
+            if self.last_modified == index_version:
+                answer = "".join(chunks)
+                self._cache_answer(cache_key, answer)
+                self._semantic_cache.put(query_embedding, answer, index_version)
+        except Exception as e:
+            yield f"❌ Error querying index: {str(e)}"
+
+
+class QueryScheduler:
+    """Runs queries on one background event loop shared by all callers.
+
+    Requests are queued and served by a fixed pool of worker coroutines, so
+    concurrent sessions overlap retrieval and generation on the same Ollama
+    instance instead of running one after another. A request whose caller
+    stops reading is aborted, so it doesn't hold a worker or Ollama slot.
+    """
+
+    def __init__(self, manager, concurrency=4):
+        self.manager = manager
+        self.concurrency = concurrency
+        self._requests = asyncio.Queue()
+        self._request_ids = itertools.count()
+        # Only touched from the loop thread: running request tasks and aborted requests still queued
+        self._active = {}
+        self._aborted = set()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        for _ in range(self.concurrency):
+            self._loop.create_task(self._worker())
+        self._loop.run_forever()
+
+    async def _worker(self):
+        while True:
+            request_id, query_text, put_chunk = await self._requests.get()
+            if request_id in self._aborted:
+                self._aborted.discard(request_id)
+                continue
+
+            task = self._loop.create_task(self._serve(query_text, put_chunk))
+            self._active[request_id] = task
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            finally:
+                del self._active[request_id]
+
+    async def _serve(self, query_text: str, put_chunk):
+        try:
+            # Closing the generator on abort also closes the in-flight Ollama stream
+            async with contextlib.aclosing(self.manager.aquery(query_text)) as chunks:
+                async for chunk in chunks:
+                    put_chunk(chunk)
         except Exception as e:
-            return f"❌ Error querying index: {str(e)}"
+            put_chunk(f"❌ Error querying index: {str(e)}")
+        finally:
+            put_chunk(None)
+
+    def _enqueue(self, query_text: str, put_chunk):
+        request_id = next(self._request_ids)
+        self._loop.call_soon_threadsafe(self._requests.put_nowait, (request_id, query_text, put_chunk))
+        return request_id
+
+    def _abort(self, request_id):
+        task = self._active.get(request_id)
+        if task is not None:
+            task.cancel()
+        else:
+            self._aborted.add(request_id)
+
+    def abort_request(self, request_id):
+        """Stop a queued or running request, its remaining chunks are dropped."""
+        self._loop.call_soon_threadsafe(self._abort, request_id)
+
+    def submit(self, query_text: str):
+        """Queue a query and yield its answer chunks as they are streamed."""
+        chunks = queue.Queue()
+        request_id = self._enqueue(query_text, chunks.put)
+        finished = False
+        try:
+            while (chunk := chunks.get()) is not None:
+                yield chunk
+            finished = True
+        finally:
+            # The caller dropped the stream, e.g. on a Streamlit rerun
+            if not finished:
+                self.abort_request(request_id)
 
+    async def asubmit(self, query_text: str):
+        """Async variant of submit(), streaming the answer chunks into the caller's event loop.
 
-# Create global index manager
-index_manager = DynamicIndexManager(storage_path)
+        The query itself still runs on the scheduler's loop, which owns the Ollama clients.
+        """
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue()
+
+        def put_chunk(chunk):
+            try:
+                loop.call_soon_threadsafe(chunks.put_nowait, chunk)
+            except RuntimeError:
+                pass  # The caller stopped reading and closed its loop
+
+        request_id = self._enqueue(query_text, put_chunk)
+        finished = False
+        try:
+            while (chunk := await chunks.get()) is not None:
+                yield chunk
+            finished = True
+        finally:
+            if not finished:
+                self.abort_request(request_id)
+
+
+# Global index manager and the scheduler serving its queries, created on first use so that
+# importing this module doesn't load the index or start watcher threads
+_index_manager = None
+_query_scheduler = None
+_init_lock = threading.Lock()
+
+
+def get_index_manager():
+    """Return the process-wide index manager, creating it exactly once."""
+    global _index_manager
+    with _init_lock:
+        if _index_manager is None:
+            _index_manager = DynamicIndexManager(storage_path)
+        return _index_manager
+
+
+def get_query_scheduler():
+    """Return the process-wide query scheduler, creating it exactly once."""
+    global _query_scheduler
+    index_manager = get_index_manager()
+    with _init_lock:
+        if _query_scheduler is None:
+            _query_scheduler = QueryScheduler(index_manager, concurrency=query_concurrency)
+        return _query_scheduler
 
 
 def ask(query: str):
-    """Query the vector index with automatic reloading support."""
-    return index_manager.query(query)
+    """Query the vector index with automatic reloading support, yielding the answer as it streams."""
+    return get_query_scheduler().submit(query)
+
+
+async def aask(query: str):
+    """Async variant of ask() for callers that already run an event loop."""
+    async for chunk in get_query_scheduler().asubmit(query):
+        yield chunk
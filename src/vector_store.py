@@ -0,0 +1,67 @@
+import os
+
+import faiss
+from llama_index.core import StorageContext
+from llama_index.core.vector_stores import SimpleVectorStore
+from llama_index.vector_stores.faiss import FaissVectorStore
+from llama_index.vector_stores.faiss.base import DEFAULT_PERSIST_PATH
+
+# "simple" keeps LlamaIndex's JSON vector store, "faiss" stores FP16 vectors in a FAISS HNSW graph
+vector_store_type = os.getenv("VECTOR_STORE", "simple").strip().lower()
+
+HNSW_NEIGHBORS = 32
+FAISS_PERSIST_FNAME = "default__vector_store.json"
+
+# Map the stored vector codes instead of reading them, pages are faulted in as searches touch them
+FAISS_MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+
+class AtomicFaissVectorStore(FaissVectorStore):
+    """FaissVectorStore that replaces its file atomically.
+
+    Readers that memory-map the index keep the old file until they reload,
+    instead of seeing it truncated and rewritten underneath them.
+    """
+
+    def persist(self, persist_path=DEFAULT_PERSIST_PATH, fs=None):
+        tmp_path = f"{persist_path}.tmp"
+        super().persist(persist_path=tmp_path, fs=fs)
+        os.replace(tmp_path, persist_path)
+
+
+def supports_delete():
+    """Check if vectors of changed files can be removed without rebuilding the index."""
+    # FAISS ids are insertion positions, LlamaIndex's FaissVectorStore can't delete them
+    return vector_store_type != "faiss"
+
+
+def create_storage_context(embed_model):
+    """Create an empty storage context backed by the configured vector store."""
+    if vector_store_type != "faiss":
+        return StorageContext.from_defaults()
+
+    # FP16 scalar quantization halves vector size and, unlike int8/PQ, needs no training pass
+    dimension = len(embed_model.get_text_embedding("dimension probe"))
+    faiss_index = faiss.IndexHNSWSQ(dimension, faiss.ScalarQuantizer.QT_fp16, HNSW_NEIGHBORS,
+                                    faiss.METRIC_INNER_PRODUCT)
+    return StorageContext.from_defaults(vector_store=AtomicFaissVectorStore(faiss_index=faiss_index))
+
+
+def load_vector_store(persist_dir, read_only=False):
+    """Load the persisted vector store of the configured type.
+
+    Read-only FAISS stores are memory-mapped, so loading doesn't copy the vectors into RAM.
+    """
+    if vector_store_type != "faiss":
+        return SimpleVectorStore.from_persist_dir(persist_dir)
+
+    if not read_only:
+        return AtomicFaissVectorStore.from_persist_dir(persist_dir)
+
+    faiss_index = faiss.read_index(os.path.join(persist_dir, FAISS_PERSIST_FNAME), FAISS_MMAP_FLAGS)
+    return AtomicFaissVectorStore(faiss_index=faiss_index)
+
+
+def load_storage_context(persist_dir):
+    """Load a persisted storage context with the configured vector store."""
+    return StorageContext.from_defaults(persist_dir=persist_dir, vector_store=load_vector_store(persist_dir))
@@ -1,16 +1,23 @@
 import os
 import sys
 import time
+import queue
+import asyncio
 import logging
+import threading
+from concurrent.futures import Future
 
+import pathspec
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 
-from llama_index.core import VectorStoreIndex, SimpleDirectoryReader, Settings, StorageContext, load_index_from_storage
+from llama_index.core import VectorStoreIndex, SimpleDirectoryReader, Settings, load_index_from_storage
 from llama_index.llms.ollama import Ollama
-from llama_index.embeddings.ollama import OllamaEmbedding
 from dotenv import load_dotenv
 
+from embeddings import CachedOllamaEmbedding
+from vector_store import create_storage_context, load_storage_context, supports_delete
+
 # Configure stdout to be unbuffered for immediate output
 sys.stdout.reconfigure(line_buffering=True)
 
@@ -21,15 +28,22 @@ storage_path = os.getenv("INDEX_STORAGE", "/app/index")
 model_name = os.getenv("MODEL_NAME", "codellama:7b")
 index_model_name = os.getenv("INDEX_MODEL_NAME", "all-minilm:l6-v2")
 ollama_base_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+embed_cache_path = os.getenv("EMBED_CACHE_PATH", "/app/cache/embeddings")
+embed_batch_size = int(os.getenv("EMBED_BATCH_SIZE", "128"))
+embed_concurrency = int(os.getenv("EMBED_CONCURRENCY", "8"))
+reader_workers = int(os.getenv("READER_WORKERS") or os.cpu_count() or 1)
 
 # Default file extensions to index
 DEFAULT_EXTS = ".lua,.xml,.txt,.cfg,.c,.cpp,.h,.hpp,.py,.js,.java,.cs,.md,.json,.yaml,.yml,.sh,.bat,.ini,.conf,.rst"
-required_exts_str = os.getenv("REQUIRED_EXTS", DEFAULT_EXTS)
+required_exts_str = os.getenv("REQUIRED_EXTS") or DEFAULT_EXTS  # An empty value keeps the defaults
 required_exts = [ext.strip() if ext.strip().startswith('.') else f'.{ext.strip()}'
                  for ext in required_exts_str.split(',') if ext.strip()] if required_exts_str else []
 
 # Configure LlamaIndex settings
-embed_model = OllamaEmbedding(model_name=index_model_name, base_url=ollama_base_url, embed_batch_size=128)
+# Each request embeds a whole batch, and up to embed_concurrency batches are in flight at once.
+# Vectors are cached by chunk content, so re-indexing only embeds text that actually changed.
+embed_model = CachedOllamaEmbedding(cache_path=embed_cache_path, model_name=index_model_name, base_url=ollama_base_url,
+                                    embed_batch_size=embed_batch_size, num_workers=embed_concurrency)
 llm = Ollama(model=model_name, base_url=ollama_base_url)
 
 Settings.llm = llm
@@ -38,112 +52,356 @@ Settings.chunk_size = 2048  # Match query.py settings for consistency
 Settings.chunk_overlap = 200  # Some overlap to maintain context
 Settings.num_workers = os.cpu_count() * 2 # Parallelism for faster indexing
 
+# Parsing in worker processes only pays off once the process start-up cost is amortized
+PARALLEL_READ_MIN_FILES = 256
+
+def load_ignore_spec(source_path):
+    """Load the .gitignore patterns of the source directory, if it has any."""
+    gitignore_path = os.path.join(source_path, '.gitignore')
+    if not os.path.isfile(gitignore_path):
+        return None
+
+    with open(gitignore_path) as f:
+        return pathspec.GitIgnoreSpec.from_lines(f)
+
+
+def is_source_file(file_path, source_path, index_path, ignore_spec):
+    """Check if a path belongs in the index, whether or not it still exists."""
+    file_path = os.path.abspath(file_path)
+    index_path = os.path.abspath(index_path)
+    # Never index our own output, persisting it would trigger another update
+    if os.path.commonpath([file_path, index_path]) == index_path:
+        return False
+
+    rel_path = os.path.relpath(file_path, source_path)
+    if rel_path == '..' or rel_path.startswith('..' + os.sep):
+        return False
+
+    # Skip hidden files and directories (.git, .idea, editor swap files, ...)
+    if any(part.startswith('.') for part in rel_path.split(os.sep)):
+        return False
+
+    if required_exts and os.path.splitext(file_path)[1] not in required_exts:
+        return False
+
+    return not (ignore_spec and ignore_spec.match_file(rel_path))
+
+
+def is_source_dir(dir_path, source_path, index_path, ignore_spec):
+    """Check if a directory may hold indexed files, whether or not it still exists."""
+    dir_path = os.path.abspath(dir_path)
+    index_path = os.path.abspath(index_path)
+    if os.path.commonpath([dir_path, index_path]) == index_path:
+        return False
+
+    rel_path = os.path.relpath(dir_path, source_path)
+    if rel_path == '..' or rel_path.startswith('..' + os.sep):
+        return False
+
+    if any(part.startswith('.') for part in rel_path.split(os.sep) if part != '.'):
+        return False
+
+    return not (ignore_spec and ignore_spec.match_file(rel_path + '/'))
+
+
+def list_source_files(source_path, index_path, ignore_spec):
+    """List all indexable files, without descending into hidden or ignored directories."""
+    index_path = os.path.abspath(index_path)
+    source_files = []
+    for root, dirs, files in os.walk(source_path):
+        rel_root = os.path.relpath(root, source_path)
+        dirs[:] = [d for d in dirs
+                   if not d.startswith('.')
+                   and os.path.abspath(os.path.join(root, d)) != index_path
+                   and not (ignore_spec and ignore_spec.match_file(os.path.normpath(os.path.join(rel_root, d)) + '/'))]
+        for file in files:
+            file_path = os.path.join(root, file)
+            if is_source_file(file_path, source_path, index_path, ignore_spec):
+                source_files.append(file_path)
+    return sorted(source_files)
+
+
+def load_source_documents(source_path, index_path):
+    """Load all indexable documents of the source directory."""
+    input_files = list_source_files(source_path, index_path, load_ignore_spec(source_path))
+    if not input_files:
+        return []
+
+    num_workers = None
+    if len(input_files) >= PARALLEL_READ_MIN_FILES:
+        num_workers = min(reader_workers, os.cpu_count() or 1)
+    reader = SimpleDirectoryReader(input_files=input_files, filename_as_id=True)
+    return reader.load_data(num_workers=num_workers)
+
+
 class CodeFileHandler(FileSystemEventHandler):
-    """Handler for file system events that rebuilds the index when code files change."""
+    """Handler for file system events that updates the index for changed code files."""
 
-    def __init__(self, source_path, index_path, debounce_time=2):
+    def __init__(self, source_path, index_path, debounce_time=2, retry_delay=30):
         self.source_path = source_path
         self.index_path = index_path
         self.debounce_time = debounce_time
-        self.last_rebuild_time = 0
+        self.retry_delay = retry_delay
+        self.gitignore_path = os.path.abspath(os.path.join(source_path, '.gitignore'))
+        self.ignore_spec = load_ignore_spec(source_path)
+        self.pending_changes = queue.Queue()
+        # Set when the next batch has to reconcile the whole source directory instead of its changed paths
+        self.sync_requested = False
+        # Resolved once the worker has built or synced the index
+        self.index_ready = Future()
+        self.worker = threading.Thread(target=self.process_changes, daemon=True)
+        self.worker.start()
 
     def should_process_file(self, file_path):
-        """Check if the file should trigger an index rebuild."""
-        if not os.path.isfile(file_path):
+        """Check if the file should trigger an index update."""
+        return os.path.isfile(file_path) and self.is_indexed_file(file_path)
+
+    def is_indexed_file(self, file_path):
+        """Check if the file belongs in the index (extension, hidden paths and .gitignore)."""
+        return is_source_file(file_path, self.source_path, self.index_path, self.ignore_spec)
+
+    def is_indexed_dir(self, dir_path):
+        """Check if the directory may hold indexed files (hidden paths and .gitignore)."""
+        return is_source_dir(dir_path, self.source_path, self.index_path, self.ignore_spec)
+
+    def reload_ignore_spec(self, file_path):
+        """Pick up edits to the source .gitignore and reconcile the index with the new patterns."""
+        if os.path.abspath(file_path) == self.gitignore_path:
+            print(f"📝 .gitignore changed, reloading ignore patterns")
+            self.ignore_spec = load_ignore_spec(self.source_path)
+            # Newly ignored files have to leave the index and no longer ignored ones have to join it
+            self.sync_requested = True
+            self.queue_change(file_path)
+
+    def queue_change(self, file_path):
+        """Queue a changed path for the next batched index update."""
+        self.pending_changes.put(os.path.abspath(file_path))
+
+    def prepare_index(self):
+        """Build the initial index if needed, otherwise catch up with changes made while not watching."""
+        return initial_index_build() or self.sync_index()
+
+    def process_changes(self):
+        """Prepare the index, then collect changes for the debounce window and update the index once per batch."""
+        # Every index build and update runs on this thread and its loop, so Ollama's async HTTP client
+        # is never shared between event loops
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        try:
+            self.sync_requested = not self.prepare_index()
+        except Exception as e:
+            self.index_ready.set_exception(e)
+            return
+        self.index_ready.set_result(None)
+
+        while True:
+            # After a failure, retry on the next change or once the retry delay has passed
+            changed_paths = set()
+            try:
+                changed_paths.add(self.pending_changes.get(timeout=self.retry_delay if self.sync_requested else None))
+            except queue.Empty:
+                pass
+            time.sleep(self.debounce_time)
+            while True:
+                try:
+                    changed_paths.add(self.pending_changes.get_nowait())
+                except queue.Empty:
+                    break
+
+            if self.sync_requested:
+                self.sync_requested = False
+                succeeded = self.sync_index()
+            else:
+                succeeded = self.update_index(changed_paths)
+
+            # The failed batch is no longer queued, so reconcile the whole tree on the next attempt
+            if not succeeded:
+                self.sync_requested = True
+
+    def load_index(self):
+        """Load the persisted index, or None if it can't be read."""
+        try:
+            return load_index_from_storage(load_storage_context(self.index_path), use_async=True)
+        except Exception as e:
+            print(f"⚠️  Could not load existing index ({e}), rebuilding from scratch")
+            return None
+
+    def update_index(self, changed_paths):
+        """Re-index only the changed files, returning whether the index was updated."""
+        print(f"🔄 Updating index for {len(changed_paths)} changed path(s)...")
+        index = self.load_index()
+        if index is None:
+            return self.rebuild_index()
+
+        try:
+            input_files = sorted(path for path in changed_paths if self.should_process_file(path))
+            documents = []
+            if input_files:
+                documents = SimpleDirectoryReader(input_files=input_files, filename_as_id=True).load_data()
+
+            # Entries of changed paths that weren't re-read belong to deleted or shrunk files.
+            # Deleted or moved directories are queued as a whole, so paths also match as prefixes.
+            document_ids = {document.id_ for document in documents}
+            changed_dirs = tuple(path + os.sep for path in changed_paths)
+            ref_docs = index.docstore.get_all_ref_doc_info() or {}
+            stale_ref_doc_ids = []
+            for ref_doc_id, ref_doc_info in ref_docs.items():
+                file_path = ref_doc_info.metadata.get('file_path')
+                if ref_doc_id in document_ids or not file_path:
+                    continue
+                file_path = os.path.abspath(file_path)
+                if file_path in changed_paths or file_path.startswith(changed_dirs):
+                    stale_ref_doc_ids.append(ref_doc_id)
+
+            return self.refresh_index(index, documents, stale_ref_doc_ids)
+
+        except Exception as e:
+            print(f"❌ Error updating index: {e}")
             return False
 
-        # Watch all files - no extension filtering
-        return True
+    def sync_index(self):
+        """Bring an existing index in line with the source directory, re-embedding only changed files.
 
-    def rebuild_index(self):
-        """Rebuild the entire index from the source directory."""
-        current_time = time.time()
+        Returns whether the index is in sync.
+        """
+        print(f"🔄 Syncing existing index with: {self.source_path}")
+        index = self.load_index()
+        if index is None:
+            return self.rebuild_index()
 
-        # Debounce: don't rebuild too frequently
-        if current_time - self.last_rebuild_time < self.debounce_time:
-            return
+        try:
+            documents = load_source_documents(self.source_path, self.index_path)
+            document_ids = {document.id_ for document in documents}
+            ref_docs = index.docstore.get_all_ref_doc_info() or {}
+            stale_ref_doc_ids = [ref_doc_id for ref_doc_id in ref_docs if ref_doc_id not in document_ids]
+
+            return self.refresh_index(index, documents, stale_ref_doc_ids)
+
+        except Exception as e:
+            print(f"❌ Error syncing index: {e}")
+            return False
+
+    def refresh_index(self, index, documents, stale_ref_doc_ids):
+        """Drop stale documents, refresh the given ones and persist the index if anything changed.
+
+        Errors propagate to the caller, the persisted index is left untouched until everything succeeded.
+        """
+        if not supports_delete():
+            modified = any(index.docstore.get_document_hash(document.id_) not in (None, document.hash)
+                           for document in documents)
+            if stale_ref_doc_ids or modified:
+                print("⚠️  Vector store can't drop outdated entries, rebuilding from scratch")
+                return self.rebuild_index()
+
+        for ref_doc_id in stale_ref_doc_ids:
+            index.delete_ref_doc(ref_doc_id, delete_from_docstore=True)
+
+        # Documents whose content hash is unchanged are skipped, so only real edits are re-embedded
+        refreshed = index.refresh_ref_docs(documents)
+        refreshed_count = sum(refreshed)
+        if not stale_ref_doc_ids and not refreshed_count:
+            print("✅ Index is already up to date")
+            return True
+
+        index.storage_context.persist(persist_dir=self.index_path)
+        print(f"📄 Re-indexed {refreshed_count} and removed {len(stale_ref_doc_ids)} documents")
+        print(f"✅ Index updated successfully at {time.strftime('%Y-%m-%d %H:%M:%S')}")
+        return True
 
+    def rebuild_index(self):
+        """Rebuild the entire index from the source directory, returning whether it succeeded."""
         print(f"🔄 Rebuilding index due to file changes...")
         try:
-            # Load documents from source directory with file extension filtering
+            # Load documents from source directory with extension and .gitignore filtering
             # Only index text-based files, skip binaries
-            reader_kwargs = {
-                'input_dir': self.source_path,
-                'recursive': True,
-                'exclude_hidden': True
-            }
-            if required_exts:
-                reader_kwargs['required_exts'] = required_exts
-
-            reader = SimpleDirectoryReader(**reader_kwargs)
-            documents = reader.load_data()
+            documents = load_source_documents(self.source_path, self.index_path)
 
             print(f"📄 Loaded {len(documents)} documents")
 
             # Create new index
-            index = VectorStoreIndex.from_documents(documents, embed_model=embed_model, show_progress=True)
+            index = VectorStoreIndex.from_documents(documents, storage_context=create_storage_context(embed_model),
+                                                    embed_model=embed_model, use_async=True, show_progress=True)
 
             # Persist the index
             index.storage_context.persist(persist_dir=self.index_path)
 
-            self.last_rebuild_time = current_time
             print(f"✅ Index rebuilt successfully at {time.strftime('%Y-%m-%d %H:%M:%S')}")
+            return True
 
         except Exception as e:
             print(f"❌ Error rebuilding index: {e}")
+            return False
 
     def on_modified(self, event):
+        if not event.is_directory:
+            self.reload_ignore_spec(event.src_path)
         if not event.is_directory and self.should_process_file(event.src_path):
             print(f"📝 File modified: {event.src_path}")
-            self.rebuild_index()
+            self.queue_change(event.src_path)
 
     def on_created(self, event):
+        if not event.is_directory:
+            self.reload_ignore_spec(event.src_path)
         if not event.is_directory and self.should_process_file(event.src_path):
             print(f"📄 File created: {event.src_path}")
-            self.rebuild_index()
+            self.queue_change(event.src_path)
 
     def on_deleted(self, event):
-        if not event.is_directory and self.should_process_file(event.src_path):
+        # The file is already gone, so only its previous index entries can be dropped
+        if not event.is_directory:
+            self.reload_ignore_spec(event.src_path)
+        if event.is_directory:
+            # Moving a directory out of the tree only reports the directory itself
+            if self.is_indexed_dir(event.src_path):
+                print(f"🗑️  Directory deleted: {event.src_path}")
+                self.queue_change(event.src_path)
+        elif self.is_indexed_file(event.src_path):
             print(f"🗑️  File deleted: {event.src_path}")
-            self.rebuild_index()
+            self.queue_change(event.src_path)
 
     def on_moved(self, event):
-        if not event.is_directory:
-            if (self.should_process_file(event.src_path) or
+        if event.is_directory:
+            if self.is_indexed_dir(event.src_path) or self.is_indexed_dir(event.dest_path):
+                print(f"📦 Directory moved: {event.src_path} -> {event.dest_path}")
+                self.queue_change(event.src_path)
+                for root, _, files in os.walk(event.dest_path):
+                    for file in files:
+                        file_path = os.path.join(root, file)
+                        if self.should_process_file(file_path):
+                            self.queue_change(file_path)
+        else:
+            self.reload_ignore_spec(event.src_path)
+            self.reload_ignore_spec(event.dest_path)
+            if (self.is_indexed_file(event.src_path) or
                 self.should_process_file(event.dest_path)):
                 print(f"📦 File moved: {event.src_path} -> {event.dest_path}")
-                self.rebuild_index()
+                self.queue_change(event.src_path)
+                self.queue_change(event.dest_path)
 
 def initial_index_build():
-    """Build the initial index if it doesn't exist."""
+    """Build the initial index if it doesn't exist, returning whether it was built."""
     if not os.path.exists(storage_path) or not os.listdir(storage_path):
         print(f"📁 Building initial index from: {project_path}")
-        reader_kwargs = {
-            'input_dir': project_path,
-            'recursive': True,
-            'exclude_hidden': True
-        }
-        if required_exts:
-            reader_kwargs['required_exts'] = required_exts
-
-        reader = SimpleDirectoryReader(**reader_kwargs)
-        documents = reader.load_data()
+        documents = load_source_documents(project_path, storage_path)
         print(f"📄 Loaded {len(documents)} documents for indexing")
-        index = VectorStoreIndex.from_documents(documents, embed_model=embed_model, show_progress=True)
+        index = VectorStoreIndex.from_documents(documents, storage_context=create_storage_context(embed_model),
+                                                embed_model=embed_model, use_async=True, show_progress=True)
         index.storage_context.persist(persist_dir=storage_path)
         print(f"✅ Initial index created: {storage_path}")
-    else:
-        print(f"📚 Using existing index: {storage_path}")
+        return True
+
+    print(f"📚 Using existing index: {storage_path}")
+    return False
 
 def start_file_watcher():
     """Start the file watcher to monitor changes in the source directory."""
     print(f"👀 Starting file watcher for: {project_path}")
 
-    # Build initial index if needed
-    initial_index_build()
+    event_handler = CodeFileHandler(project_path, storage_path)
+
+    # The handler's worker builds or syncs the index, wait for it before watching for changes
+    event_handler.index_ready.result()
 
     # Set up file watcher
-    event_handler = CodeFileHandler(project_path, storage_path)
     observer = Observer()
     observer.schedule(event_handler, project_path, recursive=True)
 